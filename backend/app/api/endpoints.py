@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+import orjson
 
-from app.models.database import get_db
+from app.models.database import AsyncSessionLocal, get_db
 from app.models.user_models import User
 from app.services.email_service import EmailService
 from app.services.prompt_service import PromptService
@@ -24,6 +26,8 @@ async def get_user_inbox(
     sort_by: str = "newest",
     limit: int = 50,
     offset: int = 0,
+    before_ts: Optional[datetime] = None,
+    before_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -31,7 +35,13 @@ async def get_user_inbox(
     try:
         email_service = EmailService(db)
         # Use user-specific method to get only current user's emails
-        emails = await email_service.get_user_emails(user_id=current_user.id, limit=limit, offset=offset)
+        emails = await email_service.get_user_emails(
+            user_id=current_user.id,
+            limit=limit,
+            offset=offset,
+            before_ts=before_ts,
+            before_id=before_id
+        )
         
         filtered_emails = emails
         if category and category != 'all':
@@ -177,11 +187,24 @@ async def debug_email_accounts(current_user: User = Depends(get_current_user)):
 
 # ========== PUBLIC ENDPOINTS (no auth required) ==========
 
-@router.get("/emails", response_model=List[Dict[str, Any]])
-async def get_emails(limit: int = 50, offset: int = 0, db: AsyncSession = Depends(get_db)):
-    """Get all emails (public for demo)"""
-    email_service = EmailService(db)
-    return await email_service.get_all_emails(limit, offset)
+@router.get(
+    "/emails",
+    response_class=StreamingResponse,
+    responses={200: {"model": List[Dict[str, Any]], "content": {"application/json": {}}}}
+)
+async def get_emails(limit: int = 50, offset: int = 0):
+    """Get all emails (public for demo), streamed as a JSON array"""
+    # The body streams after the handler returns, when a yield-dependency
+    # session may already be closed, so the generator owns its own session
+    async def json_array():
+        async with AsyncSessionLocal() as db:
+            separator = b"["
+            async for email in EmailService(db).stream_all_emails(limit, offset):
+                yield separator + orjson.dumps(email)
+                separator = b","
+            yield b"[]" if separator == b"[" else b"]"
+    
+    return StreamingResponse(json_array(), media_type="application/json")
 
 @router.post("/emails/load-mock")
 async def load_mock_emails(
@@ -244,12 +267,20 @@ async def delete_prompt(prompt_id: str, db: AsyncSession = Depends(get_db)):
 # Draft endpoints
 @router.get("/drafts", response_model=List[Dict[str, Any]])
 async def get_drafts(
+    limit: Optional[int] = None,
+    before_ts: Optional[datetime] = None,
+    before_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get user's drafts"""
     email_service = EmailService(db)
-    return await email_service.get_user_drafts(user_id=current_user.id)
+    return await email_service.get_user_drafts(
+        user_id=current_user.id,
+        limit=limit,
+        before_ts=before_ts,
+        before_id=before_id
+    )
 
 @router.post("/drafts", response_model=Dict[str, Any])  # FIXED: Removed extra bracket
 async def create_draft(
@@ -15,6 +15,7 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
     LLM_PROVIDER: str = "openai"  # openai, anthropic, or mock
+    LLM_MOCK_DELAY: float = 0.0  # seconds the mock provider waits per call
     
     # Email Settings
     MOCK_DATA_PATH: str = "data/mock_inbox.json"
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
 import os
@@ -32,6 +32,7 @@ except ImportError as e:
 
 from app.models.database import init_db, AsyncSessionLocal
 from app.services.prompt_service import PromptService
+from app.services.llm_service import close_llm_clients
 from app.core.config import settings
 from app.core.security import get_password_hash
 
@@ -59,6 +60,7 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("🛑 Shutting down...")
+    await close_llm_clients()
 
 async def create_default_admin():
     """Create a default admin user if no users exist"""
@@ -86,6 +88,7 @@ async def create_default_admin():
 # Get environment variables
 debug_mode = os.environ.get("DEBUG", "False").lower() == "true"
 port = int(os.environ.get("PORT", 8000))
+access_log = os.environ.get("ACCESS_LOG", "false").lower() == "true"
 
 # Allowed origins
 allowed_origins = [
@@ -108,6 +111,7 @@ app = FastAPI(
     description="AI-powered email management system with user authentication and real email provider integration",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json"
@@ -214,5 +218,5 @@ if __name__ == "__main__":
         port=port,
         reload=debug_mode,
         log_level="info",
-        access_log=True
+        access_log=access_log
     )
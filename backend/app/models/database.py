@@ -5,6 +5,7 @@ from datetime import datetime, timedelta  # ADDED timedelta import
 import uuid
 import asyncio
 import jwt
+import orjson
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 
@@ -158,6 +159,12 @@ class Email(Base):
             "source_provider": self.source_provider,
             "source_email_id": self.source_email_id
         }
+    
+    def list_dict(self):
+        """Lighter representation for list endpoints, without the metadata blob"""
+        data = self.to_dict()
+        del data["metadata"]
+        return data
 
 
 class PromptTemplate(Base):
@@ -211,6 +218,10 @@ class EmailDraft(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_drafts_user_updated', 'user_id', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -282,7 +293,16 @@ class SyncHistory(Base):
 # ==========================
 # DATABASE SETUP
 # ==========================
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+def _json_serializer(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
+)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
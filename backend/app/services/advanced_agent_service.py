@@ -149,13 +149,16 @@ class AdvancedAgentService:
                 existing_email.action_items = analysis.get('action_items', existing_email.action_items)
                 existing_email.email_metadata = {**existing_email.email_metadata, **analysis}
             else:
-                # Create new email
+                # Create new email; Gmail hands over a datetime, Outlook an ISO string
+                timestamp = email_data.get('timestamp')
+                if not isinstance(timestamp, datetime):
+                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
                 existing_email = Email(
                     id=email_data.get('id'),
                     sender=email_data.get('sender'),
                     subject=email_data.get('subject'),
                     body=email_data.get('body'),
-                    timestamp=datetime.fromisoformat(email_data.get('timestamp').replace('Z', '+00:00')),
+                    timestamp=timestamp,
                     category=analysis.get('category'),
                     priority=analysis.get('priority'),
                     summary=analysis.get('summary'),
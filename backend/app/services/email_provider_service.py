@@ -1,22 +1,46 @@
 import os
 import base64
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow, Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+import google_auth_httplib2
+import httplib2
 import msal
 import requests
-from datetime import datetime
+from datetime import datetime, timezone
 import email as email_lib
 from email.header import decode_header
+from email.utils import parsedate_to_datetime
+
+# Partial-response mask for messages().get(): only the fields that
+# _parse_gmail_message and _extract_gmail_body actually read.
+GMAIL_MESSAGE_FIELDS = 'id,payload/headers,payload/parts(mimeType,body/data),payload/body/data'
+
+# Maximum number of calls Gmail accepts in one batch request
+GMAIL_BATCH_LIMIT = 100
 
 class EmailProviderService:
+    # Parsed Gmail discovery document, shared by every instance
+    _gmail_discovery_doc = None
+
     def __init__(self):
         self.gmail_service = None
+        self.gmail_credentials = None
         self.outlook_service = None
+
+    @classmethod
+    def _build_gmail_service(cls, creds: Credentials):
+        """Build a Gmail API client from the cached discovery document"""
+        if cls._gmail_discovery_doc is None:
+            cls._gmail_discovery_doc = json.loads(get_static_doc('gmail', 'v1'))
+        return build_from_document(cls._gmail_discovery_doc, credentials=creds)
         
     # Gmail Integration - OAuth Methods
     async def authenticate_gmail_with_token(self, access_token: str, refresh_token: str = None) -> bool:
@@ -33,7 +57,8 @@ class EmailProviderService:
             )
             
             # Test the credentials
-            self.gmail_service = build('gmail', 'v1', credentials=creds)
+            self.gmail_service = self._build_gmail_service(creds)
+            self.gmail_credentials = creds
             
             # Make a simple API call to verify credentials work
             self.gmail_service.users().getProfile(userId='me').execute()
@@ -105,21 +130,23 @@ class EmailProviderService:
         
         creds = None
         
+        # Token file I/O, refresh and the local OAuth server all block, so
+        # they run in worker threads rather than on the event loop
         if os.path.exists(token_file):
-            creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+            creds = await asyncio.to_thread(Credentials.from_authorized_user_file, token_file, SCOPES)
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+                await asyncio.to_thread(creds.refresh, Request())
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(credentials_file, SCOPES)
-                creds = flow.run_local_server(port=0)
+                creds = await asyncio.to_thread(flow.run_local_server, port=0)
             
-            with open(token_file, 'w') as token:
-                token.write(creds.to_json())
+            await asyncio.to_thread(Path(token_file).write_text, creds.to_json())
         
         try:
-            self.gmail_service = build('gmail', 'v1', credentials=creds)
+            self.gmail_service = self._build_gmail_service(creds)
+            self.gmail_credentials = creds
             return True
         except HttpError as error:
             print(f'Gmail authentication error: {error}')
@@ -143,7 +170,8 @@ class EmailProviderService:
                 msg = self.gmail_service.users().messages().get(
                     userId='me', 
                     id=message['id'],
-                    format='full'
+                    format='full',
+                    fields=GMAIL_MESSAGE_FIELDS
                 ).execute()
                 
                 email_data = self._parse_gmail_message(msg)
@@ -162,7 +190,15 @@ class EmailProviderService:
             headers = message['payload'].get('headers', [])
             subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
             sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-            date = next((h['value'] for h in headers if h['name'] == 'Date'), datetime.now().isoformat())
+            date = next((h['value'] for h in headers if h['name'] == 'Date'), None)
+            try:
+                timestamp = parsedate_to_datetime(date) if date else datetime.utcnow()
+                # Stored as naive UTC, like the utcnow() fallback; "-0000" dates
+                # already come back naive and are UTC
+                if timestamp.tzinfo is not None:
+                    timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            except (TypeError, ValueError):
+                timestamp = datetime.utcnow()
             
             # Extract body
             body = self._extract_gmail_body(message['payload'])
@@ -172,9 +208,8 @@ class EmailProviderService:
                 'sender': sender,
                 'subject': subject,
                 'body': body,
-                'timestamp': date,
-                'provider': 'gmail',
-                'raw_data': message
+                'timestamp': timestamp,
+                'provider': 'gmail'
             }
         except Exception as e:
             print(f"Error parsing Gmail message: {e}")
@@ -252,8 +287,7 @@ class EmailProviderService:
                 'subject': message.get('subject', 'No Subject'),
                 'body': message['body'].get('content', ''),
                 'timestamp': message['receivedDateTime'],
-                'provider': 'outlook',
-                'raw_data': message
+                'provider': 'outlook'
             }
         except Exception as e:
             print(f"Error parsing Outlook message: {e}")
@@ -280,6 +314,44 @@ class EmailProviderService:
             print(f'Error sending Gmail reply: {error}')
             return False
     
+    async def send_gmail_replies(self, replies: List[Tuple[str, Dict[str, str]]]) -> List[bool]:
+        """Send several Gmail replies, up to GMAIL_BATCH_LIMIT per HTTP request.
+
+        replies holds (original_email_id, draft_content) pairs; the result says
+        whether each one was sent, in the same order.
+        """
+        sent = [False] * len(replies)
+        if not self.gmail_service:
+            return sent
+        
+        def on_sent(request_id, response, exception):
+            if exception is not None:
+                print(f'Error sending Gmail reply: {exception}')
+            else:
+                sent[int(request_id)] = True
+        
+        # Batches run in a worker thread; httplib2.Http isn't thread-safe, so
+        # they get their own connection instead of the service's shared one
+        http = google_auth_httplib2.AuthorizedHttp(self.gmail_credentials, http=httplib2.Http())
+        
+        for start in range(0, len(replies), GMAIL_BATCH_LIMIT):
+            batch = self.gmail_service.new_batch_http_request(callback=on_sent)
+            for index in range(start, min(start + GMAIL_BATCH_LIMIT, len(replies))):
+                _, draft_content = replies[index]
+                batch.add(
+                    self.gmail_service.users().messages().send(
+                        userId='me',
+                        body=self._create_gmail_message(draft_content)
+                    ),
+                    request_id=str(index)
+                )
+            try:
+                await asyncio.to_thread(batch.execute, http=http)
+            except HttpError as error:
+                print(f'Error sending Gmail reply batch: {error}')
+        
+        return sent
+    
     async def _send_outlook_reply(self, original_email_id: str, draft_content: Dict[str, str]) -> bool:
         """Send reply through Outlook"""
         try:
@@ -1,13 +1,27 @@
-import json
 import asyncio
-from typing import List, Dict, Any, Optional
+import hashlib
+from pathlib import Path
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import datetime
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import tuple_, update, delete
 from sqlalchemy.future import select
 
 from app.models.database import Email, EmailDraft
 from app.services.llm_service import LLMService
 from app.services.prompt_service import PromptService
+from app.utils.helpers import LRUCache
+
+# Draft columns that update_draft may write
+DRAFT_UPDATABLE_FIELDS = ('subject', 'body', 'recipient', 'context_email_id', 'draft_metadata')
+
+# Rows fetched per round trip when streaming emails from the database
+EMAIL_STREAM_BATCH_SIZE = 200
+
+# (category, action_items, summary) per email content and prompt versions,
+# shared across requests so repeated emails skip the LLM entirely
+_processing_cache = LRUCache(maxsize=2048)
 
 class EmailService:
     def __init__(self, db: AsyncSession):
@@ -18,8 +32,8 @@ class EmailService:
     async def load_mock_emails(self, file_path: str, user_id: str = None) -> List[Dict[str, Any]]:
         """Load mock emails from JSON file"""
         try:
-            with open(file_path, 'r') as f:
-                emails_data = json.load(f)
+            raw = await asyncio.to_thread(Path(file_path).read_bytes)
+            emails_data = orjson.loads(raw)
             
             processed_emails = []
             for email_data in emails_data:
@@ -39,25 +53,38 @@ class EmailService:
         action_prompt = await self.prompt_service.get_active_prompt("action_extraction")
         summary_prompt = await self.prompt_service.get_active_prompt("summary")
         
-        email_content = f"From: {email_data.get('sender', '')}\nSubject: {email_data.get('subject', '')}\nBody: {email_data.get('body', '')}"
+        timestamp = email_data.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        elif timestamp is None:
+            timestamp = datetime.utcnow()
         
-        # Run AI processing
-        tasks = [
-            self.llm_service.process_prompt(categorization_prompt.template, email_content),
-            self.llm_service.process_prompt(action_prompt.template, email_content),
-            self.llm_service.process_prompt(summary_prompt.template, email_content)
-        ]
+        email_content = f"From: {email_data.get('sender', '')}\nSubject: {email_data.get('subject', '')}\nBody: {email_data.get('body', '')}"
         
-        category, action_items, summary = await asyncio.gather(*tasks)
+        cache_key = (
+            hashlib.blake2b(email_content.encode(), digest_size=16).hexdigest(),
+            tuple((p.id, p.version) for p in (categorization_prompt, action_prompt, summary_prompt))
+        )
+        cached = _processing_cache.get(cache_key)
         
-        # Parse action items if it's JSON
-        try:
-            if action_items.strip().startswith('{') or action_items.strip().startswith('['):
-                action_items_parsed = json.loads(action_items)
-            else:
-                action_items_parsed = [{"task": action_items, "deadline": None}]
-        except:
-            action_items_parsed = [{"task": action_items, "deadline": None}]
+        if cached:
+            category, action_items_parsed, summary = cached
+        else:
+            # Run AI processing as a single combined request
+            results = await self.llm_service.process_prompts_combined(
+                {
+                    "category": categorization_prompt.template,
+                    "action_items": action_prompt.template,
+                    "summary": summary_prompt.template
+                },
+                email_content
+            )
+            category = str(results["category"]).strip()
+            action_items_parsed = self._parse_action_items(results["action_items"])
+            summary = str(results["summary"])
+            # LLMService reports provider failures as text; don't pin those
+            if not (category.startswith("Error processing") or summary.startswith("Error processing")):
+                _processing_cache.set(cache_key, (category, action_items_parsed, summary))
         
         # Create email record - ADD user_id field
         email = Email(
@@ -65,7 +92,7 @@ class EmailService:
             sender=email_data.get('sender', ''),
             subject=email_data.get('subject', ''),
             body=email_data.get('body', ''),
-            timestamp=datetime.fromisoformat(email_data.get('timestamp', datetime.utcnow().isoformat())),
+            timestamp=timestamp,
             category=category,
             action_items=action_items_parsed,
             summary=summary,
@@ -78,23 +105,59 @@ class EmailService:
         
         return email.to_dict()
     
-    async def get_all_emails(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """Get all emails with pagination"""
-        result = await self.db.execute(
+    def _parse_action_items(self, action_items: Any) -> List[Any]:
+        """Parse LLM action item output, wrapping plain text as a single task"""
+        if isinstance(action_items, str):
+            try:
+                parsed = orjson.loads(action_items)
+            except orjson.JSONDecodeError:
+                return [{"task": action_items, "deadline": None}]
+        else:
+            parsed = action_items
+        
+        if isinstance(parsed, list):
+            return parsed
+        if isinstance(parsed, dict):
+            return [parsed]
+        return [{"task": action_items, "deadline": None}]
+    
+    async def stream_all_emails(self, limit: int = 50, offset: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield emails newest first from a server-side cursor"""
+        result = await self.db.stream_scalars(
             select(Email).order_by(Email.timestamp.desc()).limit(limit).offset(offset)
+            .execution_options(yield_per=EMAIL_STREAM_BATCH_SIZE)
         )
-        emails = result.scalars().all()
-        return [email.to_dict() for email in emails]
+        async for email in result:
+            yield email.list_dict()
+    
+    async def get_all_emails(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get all emails with pagination"""
+        return [email async for email in self.stream_all_emails(limit, offset)]
     
-    async def get_user_emails(self, user_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """Get emails for a specific user"""
+    async def get_user_emails(
+        self,
+        user_id: str,
+        limit: int = 50,
+        offset: int = 0,
+        before_ts: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get emails for a specific user.
+
+        Pass the timestamp and id of the last email of the previous page as
+        before_ts/before_id to page with a keyset seek instead of OFFSET.
+        """
+        query = select(Email).where(Email.user_id == user_id)
+        if before_ts is not None and before_id is not None:
+            query = query.where(tuple_(Email.timestamp, Email.id) < (before_ts, before_id))
+        else:
+            query = query.offset(offset)
+        
         result = await self.db.execute(
-            select(Email).where(Email.user_id == user_id)
-            .order_by(Email.timestamp.desc())
-            .limit(limit).offset(offset)
+            query.order_by(Email.timestamp.desc(), Email.id.desc()).limit(limit)
         )
         emails = result.scalars().all()
-        return [email.to_dict() for email in emails]
+        return [email.list_dict() for email in emails]
     
     async def get_email_by_id(self, email_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific email by ID"""
@@ -104,14 +167,14 @@ class EmailService:
     
     async def update_email_category(self, email_id: str, category: str) -> bool:
         """Update email category"""
-        result = await self.db.execute(select(Email).where(Email.id == email_id))
-        email = result.scalar_one_or_none()
-        
-        if email:
-            email.category = category
-            await self.db.commit()
-            return True
-        return False
+        result = await self.db.execute(
+            update(Email)
+            .where(Email.id == email_id)
+            .values(category=category)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+        return result.rowcount > 0
     
     async def create_draft(self, draft_data: Dict[str, Any], user_id: str = None) -> Dict[str, Any]:
         """Create a new email draft"""
@@ -135,35 +198,54 @@ class EmailService:
         drafts = result.scalars().all()
         return [draft.to_dict() for draft in drafts]
     
-    async def get_user_drafts(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get drafts for a specific user"""
-        result = await self.db.execute(
-            select(EmailDraft).where(EmailDraft.user_id == user_id)
-            .order_by(EmailDraft.updated_at.desc())
-        )
+    async def get_user_drafts(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        before_ts: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get drafts for a specific user, optionally keyset-paginated on updated_at"""
+        query = select(EmailDraft).where(EmailDraft.user_id == user_id)
+        if before_ts is not None and before_id is not None:
+            query = query.where(tuple_(EmailDraft.updated_at, EmailDraft.id) < (before_ts, before_id))
+        
+        query = query.order_by(EmailDraft.updated_at.desc(), EmailDraft.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        
+        result = await self.db.execute(query)
         drafts = result.scalars().all()
         return [draft.to_dict() for draft in drafts]
     
     async def update_draft(self, draft_id: str, draft_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a draft"""
-        result = await self.db.execute(select(EmailDraft).where(EmailDraft.id == draft_id))
-        draft = result.scalar_one_or_none()
+        if 'metadata' in draft_data:
+            draft_data['draft_metadata'] = draft_data.pop('metadata')
+        values = {key: value for key, value in draft_data.items() if key in DRAFT_UPDATABLE_FIELDS}
+        
+        if not values:
+            result = await self.db.execute(select(EmailDraft).where(EmailDraft.id == draft_id))
+            draft = result.scalar_one_or_none()
+            return draft.to_dict() if draft else None
         
-        if draft:
-            for key, value in draft_data.items():
-                setattr(draft, key, value)
-            await self.db.commit()
-            await self.db.refresh(draft)
-            return draft.to_dict()
-        return None
+        result = await self.db.execute(
+            update(EmailDraft)
+            .where(EmailDraft.id == draft_id)
+            .values(**values)
+            .returning(EmailDraft)
+            .execution_options(synchronize_session=False)
+        )
+        draft = result.scalar_one_or_none()
+        await self.db.commit()
+        return draft.to_dict() if draft else None
     
     async def delete_draft(self, draft_id: str) -> bool:
         """Delete a draft"""
-        result = await self.db.execute(select(EmailDraft).where(EmailDraft.id == draft_id))
-        draft = result.scalar_one_or_none()
-        
-        if draft:
-            await self.db.delete(draft)
-            await self.db.commit()
-            return True
-        return False
+        result = await self.db.execute(
+            delete(EmailDraft)
+            .where(EmailDraft.id == draft_id)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+        return result.rowcount > 0
@@ -1,117 +1,394 @@
-import openai
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import orjson
 import json
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
+
+from app.services.llm_service import get_openai_client, llm_cache_key, llm_response_cache
+from app.utils.helpers import normalize_whitespace, truncate_text
+
+# Seconds between status checks while an OpenAI batch job is running
+BATCH_POLL_INTERVAL = float(os.getenv('OPENAI_BATCH_POLL_INTERVAL', '30'))
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Upper bound on in-flight analysis requests; keep it at or below the provider's
+# rate limit so large batches don't turn into a wall of 429 retries
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+
+# Seconds before a single chat completion is abandoned, so one stuck request
+# can't hold up a whole batch
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '30'))
+
+# Email bodies are cut to roughly 1500 tokens before analysis; long forwarded
+# threads otherwise dominate prompt size and latency
+_MAX_BODY_CHARS = 6000
+
+# System prompts are kept byte-identical across calls, with all per-email
+# and per-user content sent in user messages, so that provider-side prompt
+# prefix caching can reuse them.
+_SYSTEM_PROMPTS = {
+    "comprehensive_analysis": """
+    You are an expert email analyst. Analyze the email comprehensively and provide:
+    1. **Category**: Primary category (Important, Newsletter, Spam, To-Do, Personal, Work, Finance, Travel)
+    2. **Priority**: Urgency level (critical, high, medium, low)
+    3. **Sentiment**: Emotional tone (positive, negative, neutral, mixed)
+    4. **Key Topics**: Main subjects discussed
+    5. **Action Items**: Specific tasks with deadlines and priorities
+    6. **Relationships**: Sender importance and relationship context
+    7. **Follow-up**: Recommended follow-up actions
+    8. **Summary**: Concise 2-3 sentence summary
+    
+    Respond with structured JSON.
+    """,
+    
+    "cross_email_insights": """
+    Analyze multiple emails together to identify patterns, trends, and insights across conversations.
+    Provide relationship mapping, topic clustering, and timeline analysis.
+    """,
+    
+    "smart_reply_generation": """
+    Generate context-aware email replies that match the user's communication style.
+    Consider relationship context, email history, and appropriate tone.
+    """
+}
+
+# Analyses that run over every inbox item go to the cheaper fast model; replies
+# and free-form chat stay on the main model. The fast path only changes model and
+# temperature: comprehensive_analysis answers with eight sections, so it keeps
+# the full token budget (a truncated answer fails to parse and falls back).
+_FAST_ANALYSIS_TYPES = ("comprehensive_analysis",)
+
+# Output tokens allowed for one email's analysis, and the most the configured
+# models accept in a single response (16384 for gpt-4o-mini)
+_ANALYSIS_MAX_TOKENS = 1500
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv('LLM_MAX_OUTPUT_TOKENS', '16384'))
+
+# Fast analyses are packed this many emails per request in batch_process_emails,
+# so the system prompt is sent once per group instead of once per email. Packs
+# are kept small enough that their combined output budget fits in one response.
+EMAILS_PER_REQUEST = min(
+    int(os.getenv('LLM_EMAILS_PER_REQUEST', '10')),
+    max(1, LLM_MAX_OUTPUT_TOKENS // _ANALYSIS_MAX_TOKENS)
+)
+
+_MULTI_EMAIL_INSTRUCTION = (
+    'Analyze each of the following emails. Respond as {"results": [{...}, ...]} '
+    'with exactly one analysis object per email, preserving order.'
+)
+
+_AGENT_SYSTEM_PROMPT = """
+You are InboxAI, an intelligent email productivity assistant. You have access to the user's email context and can provide sophisticated insights.
+
+Capabilities:
+- Analyze email patterns and trends
+- Provide relationship insights
+- Suggest productivity optimizations
+- Draft context-aware responses
+- Identify urgent matters and deadlines
+
+Be helpful, concise, and focus on actionable insights.
+"""
+
+_REPLY_SYSTEM_PROMPT = """
+You are an expert email communication assistant. Generate an email reply to the original email in the requested tone.
+
+Please provide a well-structured reply that:
+1. Appropriately addresses all points from the original email
+2. Matches the specified tone
+3. Includes proper email formatting
+4. Considers any relationship context
+5. Suggests clear next steps if applicable
+
+Respond with JSON containing 'subject' and 'body' fields.
+"""
+
+_json_decoder = json.JSONDecoder()
+
+def _resolve_analysis_type(analysis_type: str) -> str:
+    """Unknown analysis types use the comprehensive analysis prompt"""
+    return analysis_type if analysis_type in _SYSTEM_PROMPTS else "comprehensive_analysis"
+
+def _parse_json_members(buffer: str, pos: int) -> Tuple[List[Tuple[str, Any]], int]:
+    """Parse the complete top-level members of a partially received JSON object.
+
+    `pos` is an offset just inside the opening brace or after the last parsed
+    member. Returns the (key, value) pairs found and the offset to resume from.
+    A value is only accepted once the character after it has arrived, so a
+    number cut off mid-stream is never reported early.
+    """
+    members = []
+    while True:
+        start = pos
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buffer) or buffer[pos] == '}':
+            return members, start if pos >= len(buffer) else pos
+        try:
+            key, pos = _json_decoder.raw_decode(buffer, pos)
+            pos = buffer.index(':', pos) + 1
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            value, pos = _json_decoder.raw_decode(buffer, pos)
+        except ValueError:
+            return members, start
+        if pos >= len(buffer) or not buffer[pos:].strip():
+            return members, start
+        members.append((key, value))
 
 class EnhancedLLMService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = get_openai_client()
         self.model = os.getenv('OPENAI_MODEL', 'gpt-4')
+        self.fast_model = os.getenv('OPENAI_FAST_MODEL', 'gpt-4o-mini')
+        self._sem = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
         
-    async def advanced_email_analysis(self, email_data: Dict[str, Any], analysis_type: str) -> Dict[str, Any]:
+    async def advanced_email_analysis(self, email_data: Dict[str, Any], analysis_type: str, _now: Optional[str] = None) -> Dict[str, Any]:
         """Perform advanced email analysis using OpenAI"""
+        request = self._build_analysis_request(email_data, analysis_type)
+        cache_key = llm_cache_key(
+            request["model"], request["temperature"], *(message["content"] for message in request["messages"])
+        )
         
-        system_prompts = {
-            "comprehensive_analysis": """
-            You are an expert email analyst. Analyze the email comprehensively and provide:
-            1. **Category**: Primary category (Important, Newsletter, Spam, To-Do, Personal, Work, Finance, Travel)
-            2. **Priority**: Urgency level (critical, high, medium, low)
-            3. **Sentiment**: Emotional tone (positive, negative, neutral, mixed)
-            4. **Key Topics**: Main subjects discussed
-            5. **Action Items**: Specific tasks with deadlines and priorities
-            6. **Relationships**: Sender importance and relationship context
-            7. **Follow-up**: Recommended follow-up actions
-            8. **Summary**: Concise 2-3 sentence summary
-            
-            Respond with structured JSON.
-            """,
+        try:
+            content = llm_response_cache.get(cache_key) if cache_key else None
+            if content is None:
+                response = await self.client.chat.completions.create(timeout=LLM_REQUEST_TIMEOUT, **request)
+                content = response.choices[0].message.content
             
-            "cross_email_insights": """
-            Analyze multiple emails together to identify patterns, trends, and insights across conversations.
-            Provide relationship mapping, topic clustering, and timeline analysis.
-            """,
+            result = orjson.loads(content)
+            if cache_key:
+                llm_response_cache.set(cache_key, content)
+            return self._enhance_analysis_result(result, email_data, request["model"], _now)
             
-            "smart_reply_generation": """
-            Generate context-aware email replies that match the user's communication style.
-            Consider relationship context, email history, and appropriate tone.
-            """
-        }
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return self._get_fallback_analysis(email_data, _now)
+    
+    async def stream_email_analysis(self, email_data: Dict[str, Any], analysis_type: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream advanced email analysis as (field, value) pairs while the completion is generated.
+
+        Consumers can act on early fields such as category before the summary has
+        been written, and can stop iterating to cancel the request. Once the
+        completion is done, the metadata advanced_email_analysis adds
+        (analysis_timestamp, model_used, original_email_id, ...) follows.
+        """
+        request = self._build_analysis_request(email_data, analysis_type)
+        cache_key = llm_cache_key(
+            request["model"], request["temperature"], *(message["content"] for message in request["messages"])
+        )
         
-        prompt = system_prompts.get(analysis_type, system_prompts["comprehensive_analysis"])
+        content = llm_response_cache.get(cache_key) if cache_key else None
+        if content is not None:
+            for item in self._enhance_analysis_result(orjson.loads(content), email_data, request["model"]).items():
+                yield item
+            return
         
+        emitted = {}
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": self._format_email_for_analysis(email_data)}
-                    ],
-                    temperature=0.3,
-                    max_tokens=1500,
-                    response_format={"type": "json_object"}
-                )
-            )
+            response = await self.client.chat.completions.create(stream=True, timeout=LLM_REQUEST_TIMEOUT, **request)
+            async with response:
+                buffer = ""
+                pos = None
+                async for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    buffer += chunk.choices[0].delta.content or ""
+                    if pos is None:
+                        brace = buffer.find("{")
+                        if brace < 0:
+                            continue
+                        pos = brace + 1
+                    members, pos = _parse_json_members(buffer, pos)
+                    for key, value in members:
+                        emitted[key] = value
+                        yield key, value
+            
+            result = orjson.loads(buffer)  # only cache complete, valid responses
+            if cache_key:
+                llm_response_cache.set(cache_key, buffer)
             
-            result = json.loads(response.choices[0].message.content)
-            return self._enhance_analysis_result(result, email_data)
+            # Metadata fields, plus any the enhancement overwrote
+            for key, value in self._enhance_analysis_result(result, email_data, request["model"]).items():
+                if key not in emitted or emitted[key] != value:
+                    yield key, value
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
-            return self._get_fallback_analysis(email_data)
+            for key, value in self._get_fallback_analysis(email_data).items():
+                if key not in emitted:
+                    yield key, value
     
     async def batch_process_emails(self, emails: List[Dict[str, Any]], analysis_type: str) -> List[Dict[str, Any]]:
         """Process multiple emails efficiently"""
-        tasks = [self.advanced_email_analysis(email, analysis_type) for email in emails]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        batch_ts = datetime.now(timezone.utc).isoformat()  # one timestamp for the whole batch
+        
+        async def _guarded(email: Dict[str, Any]) -> Dict[str, Any]:
+            async with self._sem:
+                return await self.advanced_email_analysis(email, analysis_type, _now=batch_ts)
+        
+        async def _guarded_slice(emails_slice: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with self._sem:
+                return await self._batch_analyze(emails_slice, analysis_type, _now=batch_ts)
         
-        processed_emails = []
-        for email, result in zip(emails, results):
+        if EMAILS_PER_REQUEST > 1 and _resolve_analysis_type(analysis_type) in _FAST_ANALYSIS_TYPES:
+            starts = range(0, len(emails), EMAILS_PER_REQUEST)
+            slice_results = await asyncio.gather(
+                *(_guarded_slice(emails[start:start + EMAILS_PER_REQUEST]) for start in starts),
+                return_exceptions=True
+            )
+            
+            results: List[Any] = [None] * len(emails)
+            retry = []
+            for start, slice_result in zip(starts, slice_results):
+                if isinstance(slice_result, Exception):
+                    # Fall back to one request per email for this group
+                    print(f"Batched email analysis failed: {slice_result}")
+                    retry.extend(range(start, min(start + EMAILS_PER_REQUEST, len(emails))))
+                else:
+                    results[start:start + len(slice_result)] = slice_result
+            
+            if retry:
+                retried = await asyncio.gather(*(_guarded(emails[i]) for i in retry), return_exceptions=True)
+                for i, result in zip(retry, retried):
+                    results[i] = result
+        else:
+            tasks = [_guarded(email) for email in emails]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Merge results into the input dicts so failed emails keep their fields too
+        for i, result in enumerate(results):
             if isinstance(result, Exception):
-                # Fallback processing
-                processed_emails.append(self._get_fallback_analysis(email))
+                emails[i].update(self._get_fallback_analysis(emails[i], batch_ts))
             else:
-                email.update(result)
-                processed_emails.append(email)
+                emails[i].update(result)
         
-        return processed_emails
+        return emails
     
-    async def conversational_agent(self, messages: List[Dict[str, str]], email_context: List[Dict] = None) -> str:
-        """Advanced conversational agent with email context"""
+    async def _batch_analyze(self, emails_slice: List[Dict[str, Any]], analysis_type: str, _now: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Analyze several emails with a single request, returning results in input order"""
+        requests = [self._build_analysis_request(email, analysis_type) for email in emails_slice]
+        cache_keys = [
+            llm_cache_key(request["model"], request["temperature"], *(message["content"] for message in request["messages"]))
+            for request in requests
+        ]
+        
+        analyses: List[Any] = [None] * len(emails_slice)
+        pending = []
+        for i, cache_key in enumerate(cache_keys):
+            content = llm_response_cache.get(cache_key) if cache_key else None
+            if content is None:
+                pending.append(i)
+            else:
+                analyses[i] = orjson.loads(content)
         
-        system_message = {
-            "role": "system",
-            "content": f"""
-            You are InboxAI, an intelligent email productivity assistant. You have access to the user's email context and can provide sophisticated insights.
+        if pending:
+            request = dict(requests[pending[0]])
+            request["messages"] = [
+                request["messages"][0],
+                {
+                    "role": "user",
+                    "content": _MULTI_EMAIL_INSTRUCTION + "\n\n" + "\n\n".join(
+                        f"Email {n}:\n{requests[i]['messages'][1]['content']}" for n, i in enumerate(pending, 1)
+                    )
+                }
+            ]
+            request["max_tokens"] = min(request["max_tokens"] * len(pending), LLM_MAX_OUTPUT_TOKENS)
+            
+            response = await self.client.chat.completions.create(
+                timeout=LLM_REQUEST_TIMEOUT * len(pending), **request
+            )
+            results = orjson.loads(response.choices[0].message.content).get("results")
+            if not isinstance(results, list) or len(results) != len(pending) or not all(isinstance(r, dict) for r in results):
+                raise ValueError(f"Expected {len(pending)} analyses in 'results'")
             
-            Available Context:
-            {self._format_email_context(email_context) if email_context else "No specific email context provided."}
+            for i, result in zip(pending, results):
+                analyses[i] = result
+                if cache_keys[i]:
+                    llm_response_cache.set(cache_keys[i], orjson.dumps(result).decode())
+        
+        return [
+            self._enhance_analysis_result(analysis, email, request["model"], _now)
+            for analysis, email, request in zip(analyses, emails_slice, requests)
+        ]
+    
+    async def batch_process_emails_offline(self, emails: List[Dict[str, Any]], analysis_type: str) -> List[Dict[str, Any]]:
+        """Process a large, non-interactive set of emails through the OpenAI Batch API.
+
+        Batch jobs are cheaper and not subject to per-minute rate limits, but may take
+        up to the 24h completion window, so keep batch_process_emails for anything a
+        user is waiting on.
+        """
+        if not emails:
+            return []
+        
+        batch_ts = datetime.now(timezone.utc).isoformat()
+        requests = [self._build_analysis_request(email, analysis_type) for email in emails]
+        request_lines = [
+            orjson.dumps({
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": request
+            })
+            for index, request in enumerate(requests)
+        ]
+        
+        contents: Dict[str, str] = {}
+        try:
+            input_file = await self.client.files.create(
+                file=("email_analysis.jsonl", b"\n".join(request_lines)),
+                purpose="batch"
+            )
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
             
-            Capabilities:
-            - Analyze email patterns and trends
-            - Provide relationship insights
-            - Suggest productivity optimizations
-            - Draft context-aware responses
-            - Identify urgent matters and deadlines
+            while batch.status not in BATCH_FINAL_STATUSES:
+                await asyncio.sleep(BATCH_POLL_INTERVAL)
+                batch = await self.client.batches.retrieve(batch.id)
             
-            Be helpful, concise, and focus on actionable insights.
-            """
-        }
+            if batch.output_file_id:
+                output = await self.client.files.content(batch.output_file_id)
+                for line in output.text.splitlines():
+                    if not line.strip():
+                        continue
+                    item = orjson.loads(line)
+                    response = item.get("response") or {}
+                    if response.get("status_code") == 200:
+                        contents[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        except Exception as e:
+            print(f"OpenAI batch API error: {e}")
+        
+        for index, email in enumerate(emails):
+            try:
+                result = self._enhance_analysis_result(orjson.loads(contents[str(index)]), email, requests[index]["model"], batch_ts)
+            except (KeyError, ValueError):
+                result = self._get_fallback_analysis(email, batch_ts)
+            email.update(result)
+        
+        return emails
+    
+    async def conversational_agent(self, messages: List[Dict[str, str]], email_context: List[Dict] = None) -> str:
+        """Advanced conversational agent with email context"""
         
-        conversation_messages = [system_message] + messages
+        context_message = {
+            "role": "user",
+            "content": "Available Context:\n" + (
+                self._format_email_context(email_context) if email_context else "No specific email context provided."
+            )
+        }
+        conversation_messages = [{"role": "system", "content": _AGENT_SYSTEM_PROMPT}, context_message] + messages
         
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=self.model,
-                    messages=conversation_messages,
-                    temperature=0.7,
-                    max_tokens=1000
-                )
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=conversation_messages,
+                temperature=0.7,
+                max_tokens=1000,
+                timeout=LLM_REQUEST_TIMEOUT
             )
             
             return response.choices[0].message.content
@@ -130,7 +407,7 @@ class EnhancedLLMService:
         }
         
         prompt = f"""
-        Generate an email reply with the following tone: {tone_descriptions.get(tone, 'professional')}
+        Tone: {tone_descriptions.get(tone, 'professional')}
         
         Original Email:
         From: {original_email.get('sender', 'Unknown')}
@@ -138,54 +415,64 @@ class EnhancedLLMService:
         Body: {original_email.get('body', '')}
         
         Additional Context: {self._format_email_context(context) if context else 'No additional context'}
-        
-        Please provide a well-structured reply that:
-        1. Appropriately addresses all points from the original email
-        2. Matches the specified tone
-        3. Includes proper email formatting
-        4. Considers any relationship context
-        5. Suggests clear next steps if applicable
-        
-        Respond with JSON containing 'subject' and 'body' fields.
         """
         
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are an expert email communication assistant."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=800,
-                    response_format={"type": "json_object"}
-                )
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": _REPLY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=800,
+                response_format={"type": "json_object"},
+                timeout=LLM_REQUEST_TIMEOUT
             )
             
-            reply_data = json.loads(response.choices[0].message.content)
+            reply_data = orjson.loads(response.choices[0].message.content)
             return {
                 "subject": reply_data.get("subject", f"Re: {original_email.get('subject', '')}"),
                 "body": reply_data.get("body", ""),
                 "tone": tone,
                 "ai_generated": True,
-                "generated_at": datetime.utcnow().isoformat()
+                "generated_at": datetime.now(timezone.utc).isoformat()
             }
             
         except Exception as e:
             print(f"Error generating smart reply: {e}")
             return self._get_fallback_reply(original_email, tone)
     
+    def _build_analysis_request(self, email_data: Dict[str, Any], analysis_type: str) -> Dict[str, Any]:
+        """Chat completion parameters for analysing one email"""
+        analysis_type = _resolve_analysis_type(analysis_type)
+        fast = analysis_type in _FAST_ANALYSIS_TYPES
+        
+        return {
+            "model": self.fast_model if fast else self.model,
+            "messages": [
+                {"role": "system", "content": _SYSTEM_PROMPTS[analysis_type]},
+                {"role": "user", "content": self._format_email_for_analysis(email_data)}
+            ],
+            "temperature": 0 if fast else 0.3,
+            "max_tokens": _ANALYSIS_MAX_TOKENS,
+            "response_format": {"type": "json_object"}
+        }
+    
     def _format_email_for_analysis(self, email_data: Dict[str, Any]) -> str:
         """Format email data for AI analysis"""
+        # Whitespace only: signature/forward stripping can drop the actual message
+        body = truncate_text(
+            normalize_whitespace(email_data.get('body', '')), max_length=_MAX_BODY_CHARS, suffix='\n[...truncated]'
+        )
+        
         return f"""
         Email Analysis Request:
         
         Sender: {email_data.get('sender', 'Unknown')}
         Subject: {email_data.get('subject', 'No Subject')}
         Date: {email_data.get('timestamp', 'Unknown')}
-        Body: {email_data.get('body', '')}
+        Body: {body}
         
         Additional Metadata:
         - Provider: {email_data.get('provider', 'unknown')}
@@ -198,20 +485,23 @@ class EnhancedLLMService:
         if not emails:
             return "No email context available."
         
-        context_str = "Email Context:\n\n"
+        parts = ["Email Context:\n"]
         for i, email in enumerate(emails[:5]):  # Limit context to 5 recent emails
-            context_str += f"Email {i+1}:\n"
-            context_str += f"From: {email.get('sender', 'Unknown')}\n"
-            context_str += f"Subject: {email.get('subject', 'No Subject')}\n"
-            context_str += f"Date: {email.get('timestamp', 'Unknown')}\n"
-            context_str += f"Summary: {email.get('summary', 'No summary')}\n\n"
+            parts.extend((
+                f"Email {i+1}:",
+                f"From: {email.get('sender', 'Unknown')}",
+                f"Subject: {email.get('subject', 'No Subject')}",
+                f"Date: {email.get('timestamp', 'Unknown')}",
+                f"Summary: {email.get('summary', 'No summary')}",
+                ""
+            ))
         
-        return context_str
+        return "\n".join(parts)
     
-    def _enhance_analysis_result(self, result: Dict[str, Any], original_email: Dict[str, Any]) -> Dict[str, Any]:
+    def _enhance_analysis_result(self, result: Dict[str, Any], original_email: Dict[str, Any], model: Optional[str] = None, _now: Optional[str] = None) -> Dict[str, Any]:
         """Enhance AI analysis with additional metadata"""
-        result["analysis_timestamp"] = datetime.utcnow().isoformat()
-        result["model_used"] = self.model
+        result["analysis_timestamp"] = _now or datetime.now(timezone.utc).isoformat()
+        result["model_used"] = model or self.model
         result["original_email_id"] = original_email.get("id")
         
         # Add confidence scores if not present
@@ -224,7 +514,7 @@ class EnhancedLLMService:
         
         return result
     
-    def _get_fallback_analysis(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _get_fallback_analysis(self, email_data: Dict[str, Any], _now: Optional[str] = None) -> Dict[str, Any]:
         """Provide fallback analysis when AI fails"""
         return {
             "category": "Uncategorized",
@@ -233,7 +523,7 @@ class EnhancedLLMService:
             "key_topics": ["general"],
             "action_items": [],
             "summary": "Basic analysis completed.",
-            "analysis_timestamp": datetime.utcnow().isoformat(),
+            "analysis_timestamp": _now or datetime.now(timezone.utc).isoformat(),
             "is_fallback": True
         }
     
@@ -245,5 +535,5 @@ class EnhancedLLMService:
             "tone": tone,
             "ai_generated": True,
             "is_fallback": True,
-            "generated_at": datetime.utcnow().isoformat()
+            "generated_at": datetime.now(timezone.utc).isoformat()
         }
\ No newline at end of file
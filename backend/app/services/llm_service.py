@@ -1,9 +1,85 @@
-import json
 import asyncio
+import hashlib
 from typing import Dict, Any, List, Optional
+import httpx
 import openai
-from anthropic import Anthropic
+import orjson
+from anthropic import AsyncAnthropic
 from app.core.config import settings
+from app.utils.helpers import LRUCache
+
+COMBINED_SYSTEM_MESSAGE = (
+    "You are an email processing assistant. Apply every instruction below to the same email. "
+    "Respond with a single JSON object that has one key per instruction name, each holding "
+    "the answer to that instruction."
+)
+
+AGENT_SYSTEM_MESSAGE = "You are an intelligent email productivity assistant. Help users manage their inbox, summarize emails, extract tasks, and draft responses."
+
+# Anthropic caches a prompt prefix up to a block marked with this (once the
+# prefix passes the provider's minimum cacheable length). Instructions go
+# before the email so the reusable prefix is as long as possible.
+ANTHROPIC_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Shared response cache for low-temperature requests. Bump LLM_CACHE_VERSION
+# when prompt construction changes to invalidate earlier entries.
+LLM_CACHE_VERSION = "1"
+LLM_CACHE_MAX_TEMPERATURE = 0.3
+llm_response_cache = LRUCache(maxsize=4096, ttl=24 * 60 * 60)
+
+def llm_cache_key(model: str, temperature: float, *parts: str) -> Optional[str]:
+    """Cache key for an LLM request, or None if its temperature is too high to cache"""
+    if temperature > LLM_CACHE_MAX_TEMPERATURE:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (LLM_CACHE_VERSION, model, *parts):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# Services are created per request, so the provider clients are shared
+# process-wide to keep one connection pool (and its keep-alive/TLS sessions)
+LLM_HTTP_LIMITS = httpx.Limits(max_connections=128, max_keepalive_connections=64)
+LLM_CLIENT_TIMEOUT = 30.0
+
+_http_client: Optional[httpx.AsyncClient] = None
+_openai_client: Optional[openai.AsyncOpenAI] = None
+_anthropic_client: Optional[AsyncAnthropic] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(limits=LLM_HTTP_LIMITS)
+    return _http_client
+
+def get_openai_client() -> Optional[openai.AsyncOpenAI]:
+    """Shared OpenAI client, or None if no API key is configured"""
+    global _openai_client
+    if _openai_client is None and settings.OPENAI_API_KEY:
+        _openai_client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=_get_http_client(),
+            timeout=LLM_CLIENT_TIMEOUT
+        )
+    return _openai_client
+
+def get_anthropic_client() -> Optional[AsyncAnthropic]:
+    """Shared Anthropic client, or None if no API key is configured"""
+    global _anthropic_client
+    if _anthropic_client is None and settings.ANTHROPIC_API_KEY:
+        _anthropic_client = AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            http_client=_get_http_client(),
+            timeout=LLM_CLIENT_TIMEOUT
+        )
+    return _anthropic_client
+
+async def close_llm_clients():
+    """Close the shared connection pool; call on application shutdown"""
+    global _http_client, _openai_client, _anthropic_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = _openai_client = _anthropic_client = None
 
 class LLMService:
     def __init__(self):
@@ -11,10 +87,10 @@ class LLMService:
         self.openai_client = None
         self.anthropic_client = None
         
-        if self.provider == "openai" and settings.OPENAI_API_KEY:
-            self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        elif self.provider == "anthropic" and settings.ANTHROPIC_API_KEY:
-            self.anthropic_client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        if self.provider == "openai":
+            self.openai_client = get_openai_client()
+        elif self.provider == "anthropic":
+            self.anthropic_client = get_anthropic_client()
     
     async def process_prompt(self, prompt: str, email_content: str, system_message: str = None) -> str:
         """Process a prompt with email content using the configured LLM"""
@@ -26,6 +102,53 @@ class LLMService:
         else:
             return await self._mock_processing(prompt, email_content)
     
+    async def process_prompts_combined(self, prompts: Dict[str, str], email_content: str) -> Dict[str, Any]:
+        """Run several prompts against one email in a single LLM request.
+
+        prompts maps a result key to its instruction. Keys the model leaves out of
+        its JSON answer are filled in with individual process_prompt calls.
+        """
+        instructions = "\n\n".join(f"{key}:\n{prompt}" for key, prompt in prompts.items())
+        system_message = f"{COMBINED_SYSTEM_MESSAGE}\n\nInstructions:\n\n{instructions}"
+        
+        results: Dict[str, Any] = {}
+        try:
+            if self.provider == "openai" and self.openai_client:
+                response = await self.openai_client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": f"Email Content:\n{email_content}"}
+                    ],
+                    max_tokens=1500,
+                    temperature=0.3,
+                    response_format={"type": "json_object"}
+                )
+                results = orjson.loads(response.choices[0].message.content)
+            elif self.provider == "anthropic" and self.anthropic_client:
+                response = await self.anthropic_client.messages.create(
+                    model="claude-3-sonnet-20240229",
+                    max_tokens=1500,
+                    temperature=0.3,
+                    system=[{"type": "text", "text": system_message, "cache_control": ANTHROPIC_CACHE_CONTROL}],
+                    messages=[{"role": "user", "content": f"Email Content:\n{email_content}"}]
+                )
+                results = orjson.loads(response.content[0].text)
+        except Exception as e:
+            print(f"Combined prompt processing error: {e}")
+        
+        if not isinstance(results, dict):
+            results = {}
+        
+        missing = [key for key in prompts if results.get(key) is None]
+        if missing:
+            answers = await asyncio.gather(
+                *(self.process_prompt(prompts[key], email_content) for key in missing)
+            )
+            results.update(zip(missing, answers))
+        
+        return {key: results[key] for key in prompts}
+    
     async def _process_with_openai(self, prompt: str, email_content: str, system_message: str) -> str:
         """Process using OpenAI GPT"""
         try:
@@ -34,17 +157,26 @@ class LLMService:
                 messages.append({"role": "system", "content": system_message})
             
             messages.extend([
-                {"role": "user", "content": f"Email Content:\n{email_content}\n\nInstruction: {prompt}"}
+                {"role": "user", "content": f"Instruction: {prompt}\n\nEmail Content:\n{email_content}"}
             ])
             
+            model, temperature = "gpt-3.5-turbo", 0.3
+            cache_key = llm_cache_key(model, temperature, *(message["content"] for message in messages))
+            cached = llm_response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                return cached
+            
             response = await self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=model,
                 messages=messages,
                 max_tokens=1000,
-                temperature=0.3
+                temperature=temperature
             )
             
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if cache_key:
+                llm_response_cache.set(cache_key, content)
+            return content
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return f"Error processing with OpenAI: {str(e)}"
@@ -52,13 +184,14 @@ class LLMService:
     async def _process_with_anthropic(self, prompt: str, email_content: str, system_message: str) -> str:
         """Process using Anthropic Claude"""
         try:
-            full_prompt = f"{system_message}\n\nEmail Content:\n{email_content}\n\nInstruction: {prompt}"
+            instructions = f"{system_message}\n\nInstruction: {prompt}" if system_message else f"Instruction: {prompt}"
             
-            response = self.anthropic_client.messages.create(
+            response = await self.anthropic_client.messages.create(
                 model="claude-3-sonnet-20240229",
                 max_tokens=1000,
                 temperature=0.3,
-                messages=[{"role": "user", "content": full_prompt}]
+                system=[{"type": "text", "text": instructions, "cache_control": ANTHROPIC_CACHE_CONTROL}],
+                messages=[{"role": "user", "content": f"Email Content:\n{email_content}"}]
             )
             
             return response.content[0].text
@@ -68,17 +201,18 @@ class LLMService:
     
     async def _mock_processing(self, prompt: str, email_content: str) -> str:
         """Mock processing for testing without API keys"""
-        await asyncio.sleep(1)  # Simulate processing time
+        if settings.LLM_MOCK_DELAY > 0:
+            await asyncio.sleep(settings.LLM_MOCK_DELAY)  # Simulate processing time
         
         if "categoriz" in prompt.lower():
             categories = ["Important", "Newsletter", "Spam", "To-Do"]
             return categories[len(email_content) % 4]
         elif "action" in prompt.lower() or "task" in prompt.lower():
-            return json.dumps({
+            return orjson.dumps({
                 "task": "Review the document mentioned in email",
                 "deadline": "2024-01-15",
                 "priority": "medium"
-            })
+            }).decode()
         elif "reply" in prompt.lower() or "draft" in prompt.lower():
             return "Thank you for your email. I will review this and get back to you shortly."
         elif "summar" in prompt.lower():
@@ -88,13 +222,10 @@ class LLMService:
     
     async def chat_with_agent(self, messages: List[Dict[str, str]], email_context: str = None) -> str:
         """Chat interface for the email agent"""
-        system_message = "You are an intelligent email productivity assistant. Help users manage their inbox, summarize emails, extract tasks, and draft responses."
-        
-        if email_context:
-            system_message += f"\n\nCurrent email context:\n{email_context}"
-        
         if self.provider == "openai" and self.openai_client:
-            chat_messages = [{"role": "system", "content": system_message}]
+            chat_messages = [{"role": "system", "content": AGENT_SYSTEM_MESSAGE}]
+            if email_context:
+                chat_messages.append({"role": "user", "content": f"Current email context:\n{email_context}"})
             chat_messages.extend(messages)
             
             response = await self.openai_client.chat.completions.create(
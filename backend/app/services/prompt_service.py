@@ -1,6 +1,7 @@
 import json
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update
 from sqlalchemy.future import select
 
 from app.models.database import PromptTemplate
@@ -38,23 +39,25 @@ class PromptService:
             }
         ]
         
-        for prompt_data in default_prompts:
-            # Check if prompt already exists
-            result = await self.db.execute(
-                select(PromptTemplate).where(PromptTemplate.name == prompt_data["name"])
+        # Look up which defaults already exist in a single query
+        result = await self.db.execute(
+            select(PromptTemplate.name).where(
+                PromptTemplate.name.in_([prompt_data["name"] for prompt_data in default_prompts])
             )
-            existing = result.scalar_one_or_none()
-            
-            if not existing:
-                # CHANGED: Use prompt_metadata instead of metadata
-                prompt_data["prompt_metadata"] = prompt_data.get("metadata", {})
-                if "metadata" in prompt_data:
-                    del prompt_data["metadata"]
-                    
-                prompt = PromptTemplate(**prompt_data)
-                self.db.add(prompt)
+        )
+        existing_names = set(result.scalars().all())
         
-        await self.db.commit()
+        new_prompts = []
+        for prompt_data in default_prompts:
+            if prompt_data["name"] in existing_names:
+                continue
+            # CHANGED: Use prompt_metadata instead of metadata
+            prompt_data["prompt_metadata"] = prompt_data.pop("metadata", {})
+            new_prompts.append(PromptTemplate(**prompt_data))
+        
+        if new_prompts:
+            self.db.add_all(new_prompts)
+            await self.db.commit()
     
     async def get_all_prompts(self) -> List[Dict[str, Any]]:
         """Get all prompt templates"""
@@ -113,19 +116,16 @@ class PromptService:
         return None
     
     async def _deactivate_other_prompts(self, category: str, exclude_id: str = None):
-        """Deactivate all prompts in a category except the excluded one"""
-        query = select(PromptTemplate).where(
+        """Deactivate all prompts in a category except the excluded one.
+
+        Runs as a single UPDATE; the caller commits it together with its own change.
+        """
+        stmt = update(PromptTemplate).where(
             (PromptTemplate.category == category) & 
             (PromptTemplate.is_active == True)
         )
         
         if exclude_id:
-            query = query.where(PromptTemplate.id != exclude_id)
-        
-        result = await self.db.execute(query)
-        prompts = result.scalars().all()
-        
-        for prompt in prompts:
-            prompt.is_active = False
+            stmt = stmt.where(PromptTemplate.id != exclude_id)
         
-        await self.db.commit()
\ No newline at end of file
+        await self.db.execute(stmt.values(is_active=False))
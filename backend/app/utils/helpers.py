@@ -1,25 +1,77 @@
-import json
 import asyncio
-from typing import Any, Dict, List, Optional, Union
-from datetime import datetime, timedelta
+import orjson
+import random
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Union
+from datetime import datetime, timedelta, timezone
 import re
+import time
 import uuid
+from email.utils import parseaddr
+
+# Whitespace runs other than newlines, so bodies keep their line structure
+_WHITESPACE_RE = re.compile(r'[^\S\n]+')
+_LINE_EDGE_SPACE_RE = re.compile(r'(?m)^ | $')
+# Matches from the start of the first line containing a signature marker
+_SIGNATURE_CUT_RE = re.compile(r'(?im)^.*?(?:sent from|regards,|best,|thanks,|cheers,)')
+_FORWARD_HEADER_RE = re.compile(r'(?m)^(?:---|___|From:).*(?:\n|$)')
+_SENDER_RE = re.compile(r'^[^@]+@[^@]+\.[^@]+$')
+
+# Priority scoring inputs; lookups stay a single regex scan / a few set probes
+# however long these lists grow
+URGENT_KEYWORDS = ('urgent', 'important', 'asap', 'action required', 'deadline')
+IMPORTANT_DOMAINS = frozenset({'company.com', 'management.com', 'hr.com'})
+
+_URGENT_RE = re.compile(
+    r'(?i)\b(?:' + '|'.join(map(re.escape, sorted(URGENT_KEYWORDS, key=len, reverse=True))) + ')'
+)
+
+class LRUCache:
+    """Small in-process least-recently-used cache with optional expiry (seconds)"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it as recently used"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._data)
 
 def generate_id() -> str:
     """Generate a unique ID"""
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
 
 def format_timestamp(timestamp: Optional[datetime] = None) -> str:
     """Format timestamp for display"""
     if not timestamp:
-        timestamp = datetime.utcnow()
+        timestamp = datetime.now(timezone.utc)
     return timestamp.isoformat()
 
 def parse_json_safely(json_str: str, default: Any = None) -> Any:
     """Safely parse JSON string with fallback"""
     try:
-        return json.loads(json_str)
-    except (json.JSONDecodeError, TypeError):
+        return orjson.loads(json_str)
+    except (orjson.JSONDecodeError, TypeError):
         return default
 
 def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
@@ -40,54 +92,73 @@ def extract_email_parts(email_address: str) -> Dict[str, str]:
         "full": email_address
     }
 
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces/tabs and trim each line, keeping line breaks"""
+    if not text:
+        return ""
+    
+    cleaned = _WHITESPACE_RE.sub(' ', text.strip())
+    return _LINE_EDGE_SPACE_RE.sub('', cleaned)
+
 def clean_email_body(body: str) -> str:
     """Clean and normalize email body text"""
     if not body:
         return ""
     
     # Remove excessive whitespace
-    cleaned = re.sub(r'\s+', ' ', body.strip())
-    
-    # Remove common email signatures and forward headers
-    lines = cleaned.split('\n')
-    filtered_lines = []
+    cleaned = normalize_whitespace(body)
     
-    for line in lines:
-        line = line.strip()
-        # Skip common signature markers
-        if any(marker in line.lower() for marker in ['sent from', 'regards,', 'best,', 'thanks,', 'cheers,']):
-            break
-        # Skip forward headers
-        if line.startswith('---') or line.startswith('___') or line.startswith('From:'):
-            continue
-        filtered_lines.append(line)
+    # Cut at the first signature marker, then drop forward headers
+    match = _SIGNATURE_CUT_RE.search(cleaned)
+    if match:
+        cleaned = cleaned[:match.start()]
+    cleaned = _FORWARD_HEADER_RE.sub('', cleaned)
     
-    return '\n'.join(filtered_lines)
+    return cleaned.strip()
+
+def _is_important_domain(domain: str) -> bool:
+    """Whether the domain is one of IMPORTANT_DOMAINS or a subdomain of one"""
+    # Probe the domain and each parent domain; one set lookup per label
+    while True:
+        if domain in IMPORTANT_DOMAINS:
+            return True
+        dot = domain.find('.')
+        if dot < 0:
+            return False
+        domain = domain[dot + 1:]
 
 def calculate_priority_score(email_data: Dict[str, Any]) -> int:
     """Calculate priority score for email (0-100)"""
-    score = 50  # Default medium priority
-    
-    # Adjust based on sender (you can expand this)
-    important_domains = ['company.com', 'management.com', 'hr.com']
-    sender_domain = extract_email_parts(email_data.get('sender', '')).get('domain', '')
-    if any(domain in sender_domain for domain in important_domains):
-        score += 20
-    
-    # Adjust based on subject keywords
-    urgent_keywords = ['urgent', 'important', 'asap', 'action required', 'deadline']
-    subject = email_data.get('subject', '').lower()
-    if any(keyword in subject for keyword in urgent_keywords):
-        score += 25
+    return calculate_priority_scores([email_data])[0]
+
+def calculate_priority_scores(emails: List[Dict[str, Any]]) -> List[int]:
+    """Calculate priority scores (0-100) for a batch of emails in one pass"""
+    urgent_search = _URGENT_RE.search
+    scores = []
     
-    # Adjust based on content length (longer emails might be more important)
-    body = email_data.get('body', '')
-    if len(body) > 500:
-        score += 5
-    elif len(body) < 50:
-        score -= 10
+    for email_data in emails:
+        score = 50  # Default medium priority
+        
+        # Adjust based on sender (you can expand this)
+        # Real From headers are often "Name <addr>", so parse out the address first
+        _, at, sender_domain = parseaddr(email_data.get('sender', ''))[1].partition('@')
+        if at and _is_important_domain(sender_domain.lower()):
+            score += 20
+        
+        # Adjust based on subject keywords
+        if urgent_search(email_data.get('subject', '')):
+            score += 25
+        
+        # Adjust based on content length (longer emails might be more important)
+        body_length = len(email_data.get('body', ''))
+        if body_length > 500:
+            score += 5
+        elif body_length < 50:
+            score -= 10
+        
+        scores.append(max(0, min(100, score)))
     
-    return max(0, min(100, score))
+    return scores
 
 def format_priority(score: int) -> str:
     """Convert priority score to category"""
@@ -100,8 +171,8 @@ def format_priority(score: int) -> str:
     else:
         return "low"
 
-async def async_retry(operation, max_retries: int = 3, delay: float = 1.0):
-    """Retry an async operation with exponential backoff"""
+async def async_retry(operation, max_retries: int = 3, delay: float = 1.0, max_delay: float = 30.0):
+    """Retry an async operation with capped, jittered exponential backoff"""
     last_exception = None
     
     for attempt in range(max_retries):
@@ -110,7 +181,8 @@ async def async_retry(operation, max_retries: int = 3, delay: float = 1.0):
         except Exception as e:
             last_exception = e
             if attempt < max_retries - 1:
-                await asyncio.sleep(delay * (2 ** attempt))  # Exponential backoff
+                # Exponential backoff with jitter so concurrent callers don't retry in lockstep
+                await asyncio.sleep(min(max_delay, delay * (2 ** attempt) * (0.5 + random.random())))
     
     raise last_exception
 
@@ -123,7 +195,7 @@ def validate_email_structure(email_data: Dict[str, Any]) -> List[str]:
         if field not in email_data or not email_data[field]:
             errors.append(f"Missing required field: {field}")
     
-    if 'sender' in email_data and not re.match(r'^[^@]+@[^@]+\.[^@]+$', email_data['sender']):
+    if 'sender' in email_data and not _SENDER_RE.match(email_data['sender']):
         errors.append("Invalid sender email format")
     
     return errors
@@ -1,192 +1,454 @@
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import orjson
+from collections import deque, namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import email.utils
-from urllib.parse import urlparse
 
-class EmailValidator:
-    """Email validation utilities"""
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_SCRIPT_RE = re.compile(r'<script\b.*?</script>', re.IGNORECASE | re.DOTALL)
+# Greedy prefix up to the last closing tag, found by backtracking from the end
+_LAST_SCRIPT_CLOSE_RE = re.compile(r'.*</script>', re.IGNORECASE | re.DOTALL)
+# on*="..." handlers, matched from the start of the word so the search stays
+# linear: the lookahead rejects words not followed by '=' in one pass and the
+# atomic group stops retries at every later "on" (the old `on\w+=...` form
+# was quadratic on long words). Group 1 is any word prefix before the "on".
+_EVENT_HANDLER_RE = re.compile(r'(?<!\w)(?=\w+=)(?>(\w*?)on\w+=)\s*["\'][^"\']*["\']')
+_JAVASCRIPT_RE = re.compile(r'javascript:', re.IGNORECASE)
+_VBSCRIPT_RE = re.compile(r'vbscript:', re.IGNORECASE)
+# scheme://netloc prefix; enough for validation without a full urlparse
+_URL_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.\-]*)://([^/?#\s]+)')
+_DANGEROUS_SCHEMES = frozenset({'javascript', 'vbscript', 'data'})
+
+# Python types accepted for each JSON schema type (bools are rejected
+# separately for number/integer)
+_JSON_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'null': type(None)
+}
+
+_REQUIRED_HEADERS = ('From', 'Subject')
+_REQUIRED_HEADER_SET = frozenset(_REQUIRED_HEADERS)
+_REQUIRED_TEMPLATE_FIELDS = ('name', 'template', 'category')
+_CATEGORY_ORDER = ('categorization', 'action_extraction', 'reply_draft', 'summary', 'analysis')
+_VALID_CATEGORIES = frozenset(_CATEGORY_ORDER)
+_REQUIRED_PARAM_FIELDS = frozenset({'type', 'required', 'description'})
+_VALID_PARAM_TYPES = frozenset({'string', 'number', 'boolean', 'array', 'object'})
+
+_CompiledSchema = namedtuple(
+    '_CompiledSchema',
+    'type expected numeric required required_set properties items min_length max_length'
+)
+
+def _compile_schema(schema: Dict[str, Any]) -> _CompiledSchema:
+    """Flatten a schema node into a tuple"""
+    schema_type = schema.get('type')
+    required = tuple(schema.get('required', ()))
+    return _CompiledSchema(
+        type=schema_type,
+        expected=_JSON_TYPES.get(schema_type),
+        numeric=schema_type in ('number', 'integer'),
+        required=required,
+        required_set=frozenset(required),
+        properties=schema.get('properties', {}),
+        items=schema.get('items', {}),
+        min_length=schema.get('minLength'),
+        max_length=schema.get('maxLength')
+    )
+
+# Bulk ingestion sees the same From/Date header values over and over
+@lru_cache(maxsize=4096)
+def _parseaddr(value: str) -> Tuple[str, str]:
+    return email.utils.parseaddr(value)
+
+@lru_cache(maxsize=4096)
+def _parsedate(value: str) -> datetime:
+    return email.utils.parsedate_to_datetime(value)
+
+def _match_url(url: str) -> Optional[re.Match]:
+    try:
+        return _URL_RE.match(url)
+    except TypeError:  # not a string
+        return None
+
+def _strip_script_tags(content: str, lowered: Optional[str] = None) -> str:
+    """Remove <script ...>...</script> elements in linear time.
+
+    Nothing after the last closing tag can be part of an element, so the lazy
+    pattern only runs on the text before it, where every opening tag has a
+    closing tag to stop at. Without that cut, each unclosed opening tag would
+    rescan to the end of the content. `lowered` is content.lower() for ASCII
+    content, letting the cut be found with a plain substring search.
+    """
+    if lowered is not None:
+        cut = lowered.rfind('</script>')
+        if cut < 0:
+            return content
+        cut += 9
+    else:
+        last = _LAST_SCRIPT_CLOSE_RE.match(content)
+        if not last:
+            return content
+        cut = last.end()
     
-    @staticmethod
-    def validate_email_format(email_address: str) -> bool:
-        """Validate email format using RFC 5322"""
-        if not email_address or len(email_address) > 254:
-            return False
-        
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email_address))
+    return _SCRIPT_RE.sub('', content[:cut]) + content[cut:]
+
+def validate_email_format(email_address: str) -> bool:
+    """Validate email format using RFC 5322"""
+    if not email_address or len(email_address) > 254:
+        return False
     
-    @staticmethod
-    def validate_email_headers(headers: Dict[str, str]) -> List[str]:
-        """Validate email headers and return list of issues"""
-        issues = []
-        
-        # Check required headers
-        required_headers = ['From', 'Subject']
-        for header in required_headers:
+    # Cheap rejects before running the regex (which only accepts ASCII)
+    if not email_address.isascii():
+        return False
+    at = email_address.rfind('@')
+    if at <= 0 or at == len(email_address) - 1:
+        return False
+    if '.' not in email_address[at + 1:]:
+        return False
+    
+    return bool(_EMAIL_RE.match(email_address))
+
+def validate_email_format_batch(email_addresses: List[str]) -> List[bool]:
+    """Validate many email addresses at once, preserving input order"""
+    return list(map(validate_email_format, email_addresses))
+
+def validate_email_headers(headers: Dict[str, str]) -> List[str]:
+    """Validate email headers and return list of issues"""
+    issues = []
+    
+    # Check required headers
+    if not headers.keys() >= _REQUIRED_HEADER_SET:
+        for header in _REQUIRED_HEADERS:
             if header not in headers:
                 issues.append(f"Missing required header: {header}")
-        
-        # Validate From header
-        if 'From' in headers:
-            try:
-                email.utils.parseaddr(headers['From'])
-            except (ValueError, AttributeError):
-                issues.append("Invalid From header format")
-        
-        # Validate Date header if present
-        if 'Date' in headers:
-            try:
-                email.utils.parsedate_to_datetime(headers['Date'])
-            except (ValueError, TypeError):
-                issues.append("Invalid Date header format")
-        
-        return issues
     
-    @staticmethod
-    def sanitize_email_content(content: str) -> str:
-        """Sanitize email content to prevent XSS and injection attacks"""
-        if not content:
-            return ""
-        
-        # Remove script tags and event handlers
-        sanitized = re.sub(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>', '', content, flags=re.IGNORECASE)
-        sanitized = re.sub(r'on\w+=\s*["\'][^"\']*["\']', '', sanitized)
-        sanitized = re.sub(r'javascript:', '', sanitized, flags=re.IGNORECASE)
-        sanitized = re.sub(r'vbscript:', '', sanitized, flags=re.IGNORECASE)
-        
-        return sanitized
+    # Validate From header
+    if 'From' in headers:
+        try:
+            _parseaddr(headers['From'])
+        except (ValueError, AttributeError, TypeError):
+            issues.append("Invalid From header format")
+    
+    # Validate Date header if present
+    if 'Date' in headers:
+        try:
+            _parsedate(headers['Date'])
+        except (ValueError, TypeError):
+            issues.append("Invalid Date header format")
+    
+    return issues
 
-class PromptValidator:
-    """Prompt template validation utilities"""
+def sanitize_email_content(content: str) -> str:
+    """Sanitize email content to prevent XSS and injection attacks"""
+    if not content:
+        return ""
     
-    @staticmethod
-    def validate_prompt_template(template_data: Dict[str, Any]) -> Tuple[bool, List[str]]:
-        """Validate prompt template structure"""
-        errors = []
-        
-        required_fields = ['name', 'template', 'category']
-        for field in required_fields:
-            if field not in template_data or not template_data[field]:
-                errors.append(f"Missing required field: {field}")
-        
-        # Validate category
-        valid_categories = ['categorization', 'action_extraction', 'reply_draft', 'summary', 'analysis']
-        if 'category' in template_data and template_data['category'] not in valid_categories:
-            errors.append(f"Invalid category. Must be one of: {', '.join(valid_categories)}")
-        
-        # Validate template length
-        if 'template' in template_data:
-            template = template_data['template']
-            if len(template) < 10:
-                errors.append("Prompt template too short (minimum 10 characters)")
-            if len(template) > 10000:
-                errors.append("Prompt template too long (maximum 10,000 characters)")
-        
-        return len(errors) == 0, errors
+    # Remove script tags and event handlers, skipping passes whose trigger
+    # text is absent. The lowercased copy is computed once and only used for
+    # ASCII text, where it agrees exactly with re.IGNORECASE (lower() can
+    # change the length of other text, and IGNORECASE folds more characters).
+    ascii_text = content.isascii()
+    lowered = content.lower() if ascii_text else None
+    
+    sanitized = content
+    if '<' in sanitized:
+        sanitized = _strip_script_tags(sanitized, lowered)
+    if '=' in sanitized and 'on' in sanitized:
+        sanitized = _EVENT_HANDLER_RE.sub(r'\1', sanitized)
+    if ':' in sanitized:
+        if ascii_text and sanitized != content:
+            lowered = sanitized.lower()
+        if not ascii_text or 'javascript:' in lowered:
+            stripped = _JAVASCRIPT_RE.sub('', sanitized)
+            if ascii_text and len(stripped) != len(sanitized):
+                lowered = stripped.lower()
+            sanitized = stripped
+        if not ascii_text or 'vbscript:' in lowered:
+            sanitized = _VBSCRIPT_RE.sub('', sanitized)
+    
+    return sanitized
+
+def validate_prompt_template(template_data: Dict[str, Any]) -> Tuple[bool, List[str]]:
+    """Validate prompt template structure"""
+    errors = []
+    
+    for field in _REQUIRED_TEMPLATE_FIELDS:
+        if field not in template_data or not template_data[field]:
+            errors.append(f"Missing required field: {field}")
     
-    @staticmethod
-    def validate_prompt_parameters(parameters: Dict[str, Any]) -> bool:
-        """Validate prompt parameters structure"""
-        if not isinstance(parameters, dict):
+    # Validate category
+    category = template_data.get('category')
+    if 'category' in template_data and not (isinstance(category, str) and category in _VALID_CATEGORIES):
+        errors.append(f"Invalid category. Must be one of: {', '.join(_CATEGORY_ORDER)}")
+    
+    # Validate template length
+    if 'template' in template_data:
+        template = template_data['template']
+        if len(template) < 10:
+            errors.append("Prompt template too short (minimum 10 characters)")
+        if len(template) > 10000:
+            errors.append("Prompt template too long (maximum 10,000 characters)")
+    
+    return len(errors) == 0, errors
+
+def validate_prompt_parameters(parameters: Dict[str, Any]) -> bool:
+    """Validate prompt parameters structure"""
+    if not isinstance(parameters, dict):
+        return False
+    
+    for param_name, param_config in parameters.items():
+        if not isinstance(param_config, dict):
             return False
         
-        for param_name, param_config in parameters.items():
-            if not isinstance(param_config, dict):
-                return False
-            
-            required_config_fields = ['type', 'required', 'description']
-            for field in required_config_fields:
-                if field not in param_config:
-                    return False
-            
-            # Validate type
-            valid_types = ['string', 'number', 'boolean', 'array', 'object']
-            if param_config['type'] not in valid_types:
-                return False
+        if not param_config.keys() >= _REQUIRED_PARAM_FIELDS:
+            return False
         
-        return True
+        # Validate type
+        param_type = param_config['type']
+        if not (isinstance(param_type, str) and param_type in _VALID_PARAM_TYPES):
+            return False
+    
+    return True
 
-class JSONValidator:
-    """JSON validation utilities"""
+def _validate(data: Any, schema: Dict[str, Any], path: str, errors: List[str]) -> None:
+    """Append every schema violation under `path` to `errors`"""
+    pending = deque([(data, schema, path)])
+    # Flattened nodes are reused within this call only, so a schema mutated
+    # between calls is always read afresh
+    compiled_nodes: Dict[int, _CompiledSchema] = {}
     
-    @staticmethod
-    def validate_json_structure(data: Any, schema: Dict[str, Any]) -> Tuple[bool, List[str]]:
-        """Validate JSON data against a simple schema"""
-        errors = []
+    while pending:
+        data, schema, path = pending.popleft()
+        prefix = f"{path}: " if path else ""
+        compiled = compiled_nodes.get(id(schema))
+        if compiled is None:
+            compiled = compiled_nodes[id(schema)] = _compile_schema(schema)
         
-        if not isinstance(data, type(schema.get('type', type(None)))):
-            errors.append(f"Expected type {schema.get('type')}, got {type(data)}")
-            return False, errors
+        if compiled.expected and (not isinstance(data, compiled.expected) or (compiled.numeric and isinstance(data, bool))):
+            errors.append(f"{prefix}Expected type {compiled.type}, got {type(data).__name__}")
+            continue
         
-        if schema.get('type') == 'object':
-            required_fields = schema.get('required', [])
-            for field in required_fields:
-                if field not in data:
-                    errors.append(f"Missing required field: {field}")
+        if compiled.type == 'object':
+            if compiled.required_set and not data.keys() >= compiled.required_set:
+                for field in compiled.required:
+                    if field not in data:
+                        errors.append(f"{prefix}Missing required field: {field}")
             
-            properties = schema.get('properties', {})
-            for field, value in data.items():
-                if field in properties:
-                    field_schema = properties[field]
-                    is_valid, field_errors = JSONValidator.validate_json_structure(value, field_schema)
-                    if not is_valid:
-                        errors.extend([f"{field}.{error}" for error in field_errors])
+            properties = compiled.properties
+            if properties:
+                for field, value in data.items():
+                    if field in properties:
+                        pending.append((value, properties[field], f"{path}.{field}" if path else field))
         
-        elif schema.get('type') == 'array':
-            items_schema = schema.get('items', {})
+        elif compiled.type == 'array':
+            items_schema = compiled.items
             for i, item in enumerate(data):
-                is_valid, item_errors = JSONValidator.validate_json_structure(item, items_schema)
-                if not is_valid:
-                    errors.extend([f"[{i}].{error}" for error in item_errors])
-        
-        # Validate constraints
-        if 'minLength' in schema and len(str(data)) < schema['minLength']:
-            errors.append(f"Value too short (minimum {schema['minLength']} characters)")
+                pending.append((item, items_schema, f"{path}[{i}]"))
         
-        if 'maxLength' in schema and len(str(data)) > schema['maxLength']:
-            errors.append(f"Value too long (maximum {schema['maxLength']} characters)")
-        
-        return len(errors) == 0, errors
+        # Validate constraints (strings, arrays and objects by their own length)
+        min_length, max_length = compiled.min_length, compiled.max_length
+        if min_length is not None or max_length is not None:
+            length = len(data) if isinstance(data, (str, list, dict)) else len(str(data))
+            
+            if min_length is not None and length < min_length:
+                errors.append(f"{prefix}Value too short (minimum {min_length} characters)")
+            
+            if max_length is not None and length > max_length:
+                errors.append(f"{prefix}Value too long (maximum {max_length} characters)")
+
+def validate_json_structure(data: Any, schema: Dict[str, Any]) -> Tuple[bool, List[str]]:
+    """Validate JSON data against a simple schema"""
+    errors = []
+    _validate(data, schema, "", errors)
+    return not errors, errors
+
+def _bind(value: Any, namespace: Dict[str, Any]) -> str:
+    """Source for a constant: a literal for str/int, otherwise a namespace name"""
+    if type(value) in (str, int):
+        return repr(value)
+    name = f"_k{len(namespace)}"
+    namespace[name] = value
+    return name
+
+def _emit_node(schema: Dict[str, Any], namespace: Dict[str, Any], names: Dict[int, str],
+               functions: List[str], tables: List[str]) -> Optional[str]:
+    """Generate the function checking one schema node, returning its name.
+
+    Returns None for nodes that can never report an error, so parents don't
+    queue them at all. Nodes are named by id() before their children are
+    emitted, which lets shared and self-referencing subschemas reuse one
+    function.
+    """
+    compiled = _compile_schema(schema)
+    if compiled.expected is None and compiled.min_length is None and compiled.max_length is None:
+        return None
+    if id(schema) in names:
+        return names[id(schema)]
+    name = names[id(schema)] = f"_n{len(names)}"
     
-    @staticmethod
-    def safe_json_loads(json_string: str, default: Any = None) -> Any:
-        """Safely load JSON with error handling"""
-        try:
-            return json.loads(json_string)
-        except (json.JSONDecodeError, TypeError, ValueError):
-            return default
+    prefix = '(f"{path}: " if path else "")'
+    lines = [f"def {name}(d, path, errors, pending):"]
+    
+    if compiled.expected is not None:
+        check = f"not isinstance(d, {_bind(compiled.expected, namespace)})"
+        if compiled.numeric:
+            check += " or isinstance(d, bool)"
+        message = f"Expected type {compiled.type}, got "
+        lines.append(f"    if {check}:")
+        lines.append(f"        errors.append({prefix} + {message!r} + type(d).__name__)")
+        lines.append("        return")
+    
+    if compiled.type == 'object':
+        for field in compiled.required:
+            lines.append(f"    if {_bind(field, namespace)} not in d:")
+            lines.append(f"        errors.append({prefix} + {f'Missing required field: {field}'!r})")
+    
+        children = {}
+        for field, child_schema in compiled.properties.items():
+            child = _emit_node(child_schema, namespace, names, functions, tables)
+            if child is not None:
+                children[field] = child
+        if children:
+            table = f"_p{name}"
+            entries = ", ".join(f"{_bind(field, namespace)}: {child}" for field, child in children.items())
+            tables.append(f"{table} = {{{entries}}}")
+            lines.append("    for field, value in d.items():")
+            lines.append(f"        child = {table}.get(field)")
+            lines.append("        if child is not None:")
+            lines.append('            pending.append((child, value, f"{path}.{field}" if path else field))')
+    
+    elif compiled.type == 'array':
+        child = _emit_node(compiled.items, namespace, names, functions, tables)
+        if child is not None:
+            lines.append("    for i, item in enumerate(d):")
+            lines.append(f'        pending.append(({child}, item, f"{{path}}[{{i}}]"))')
+    
+    min_length, max_length = compiled.min_length, compiled.max_length
+    if min_length is not None or max_length is not None:
+        # The type check above already guarantees str/list/dict for these
+        if compiled.type in ('string', 'array', 'object'):
+            lines.append("    length = len(d)")
+        else:
+            lines.append("    length = len(d) if isinstance(d, (str, list, dict)) else len(str(d))")
+        if min_length is not None:
+            lines.append(f"    if length < {_bind(min_length, namespace)}:")
+            lines.append(f"        errors.append({prefix} + {f'Value too short (minimum {min_length} characters)'!r})")
+        if max_length is not None:
+            lines.append(f"    if length > {_bind(max_length, namespace)}:")
+            lines.append(f"        errors.append({prefix} + {f'Value too long (maximum {max_length} characters)'!r})")
+    
+    functions.append("\n".join(lines))
+    return name
+
+def _build_validator(schema: Dict[str, Any]) -> Callable[[Any], Tuple[bool, List[str]]]:
+    namespace: Dict[str, Any] = {'deque': deque}
+    functions: List[str] = []
+    tables: List[str] = []
+    root = _emit_node(schema, namespace, {}, functions, tables)
+    
+    if root is None:
+        functions.append("def _validate(d):\n    return True, []")
+    else:
+        # Same breadth-first order as _validate, so errors come out identically
+        functions.append(
+            "def _validate(d):\n"
+            "    errors = []\n"
+            "    pending = deque()\n"
+            f"    {root}(d, '', errors, pending)\n"
+            "    while pending:\n"
+            "        node, d, path = pending.popleft()\n"
+            "        node(d, path, errors, pending)\n"
+            "    return not errors, errors"
+        )
+    
+    source = "\n\n".join(functions + tables)
+    exec(compile(source, "<schema validator>", "exec"), namespace)
+    return namespace['_validate']
+
+# Generated validators by id(); each entry keeps its schema alive so the id
+# can't be reused while cached. Only compile_validator caches across calls.
+_VALIDATOR_CACHE_MAXSIZE = 512
+_compiled_validators: Dict[int, Tuple[Dict[str, Any], Callable[[Any], Tuple[bool, List[str]]]]] = {}
+
+def compile_validator(schema: Dict[str, Any]) -> Callable[[Any], Tuple[bool, List[str]]]:
+    """Build a function validating data against a fixed schema.
+
+    The returned function gives the same result as
+    validate_json_structure(data, schema), with the schema baked into
+    generated code instead of being interpreted on every call. Use it for
+    schemas checked against many payloads; the schema must not be mutated
+    afterwards.
+    """
+    entry = _compiled_validators.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+    
+    validator = _build_validator(schema)
+    
+    if len(_compiled_validators) >= _VALIDATOR_CACHE_MAXSIZE:
+        _compiled_validators.clear()
+    _compiled_validators[id(schema)] = (schema, validator)
+    return validator
+
+def safe_json_loads(json_string: str, default: Any = None) -> Any:
+    """Safely load JSON with error handling"""
+    try:
+        return orjson.loads(json_string)
+    except (orjson.JSONDecodeError, TypeError):
+        return default
+
+def validate_url(url: str) -> bool:
+    """Validate URL format"""
+    return _match_url(url) is not None
+
+def is_safe_url(url: str, allowed_domains: List[str] = None) -> bool:
+    """Check if URL is safe (not malicious)"""
+    match = _match_url(url)
+    if not match:
+        return False
+    
+    # Check for dangerous protocols
+    if match.group(1).lower() in _DANGEROUS_SCHEMES:
+        return False
+    
+    # Check against allowed domains if provided
+    if allowed_domains and match.group(2) not in allowed_domains:
+        return False
+    
+    return True
+
+# Class namespaces kept for existing callers; the functions above are the
+# implementations and are cheaper to call directly
+class EmailValidator:
+    """Email validation utilities"""
+    
+    validate_email_format = staticmethod(validate_email_format)
+    validate_email_format_batch = staticmethod(validate_email_format_batch)
+    validate_email_headers = staticmethod(validate_email_headers)
+    sanitize_email_content = staticmethod(sanitize_email_content)
+
+class PromptValidator:
+    """Prompt template validation utilities"""
+    
+    validate_prompt_template = staticmethod(validate_prompt_template)
+    validate_prompt_parameters = staticmethod(validate_prompt_parameters)
+
+class JSONValidator:
+    """JSON validation utilities"""
+    
+    validate_json_structure = staticmethod(validate_json_structure)
+    safe_json_loads = staticmethod(safe_json_loads)
+    compile_validator = staticmethod(compile_validator)
 
 class URLValidator:
     """URL validation utilities"""
     
-    @staticmethod
-    def validate_url(url: str) -> bool:
-        """Validate URL format"""
-        try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except Exception:
-            return False
-    
-    @staticmethod
-    def is_safe_url(url: str, allowed_domains: List[str] = None) -> bool:
-        """Check if URL is safe (not malicious)"""
-        if not URLValidator.validate_url(url):
-            return False
-        
-        try:
-            result = urlparse(url)
-            
-            # Check for dangerous protocols
-            dangerous_schemes = ['javascript', 'vbscript', 'data']
-            if result.scheme.lower() in dangerous_schemes:
-                return False
-            
-            # Check against allowed domains if provided
-            if allowed_domains and result.netloc not in allowed_domains:
-                return False
-            
-            return True
-        except Exception:
-            return False
\ No newline at end of file
+    validate_url = staticmethod(validate_url)
+    is_safe_url = staticmethod(is_safe_url)
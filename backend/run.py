@@ -30,6 +30,16 @@ def main():
     port = int(os.getenv("PORT", "8000"))
     reload = os.getenv("RELOAD", "true").lower() == "true"
     log_level = os.getenv("LOG_LEVEL", "info")
+    workers = int(os.getenv("WORKERS", "1"))
+    # "auto" picks uvloop/httptools when installed (they ship with uvicorn[standard])
+    loop = os.getenv("LOOP", "auto")
+    http = os.getenv("HTTP", "auto")
+    # Per-request access logging is synchronous; opt in when needed
+    access_log = os.getenv("ACCESS_LOG", "false").lower() == "true"
+    
+    # uvicorn can't combine the reloader with multiple worker processes
+    if workers > 1:
+        reload = False
     
     print("=" * 60)
     print("Email Productivity Agent - Backend Server")
@@ -37,7 +47,10 @@ def main():
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"Reload: {reload}")
+    print(f"Workers: {workers}")
+    print(f"Loop: {loop} / HTTP: {http}")
     print(f"Log Level: {log_level}")
+    print(f"Access Log: {access_log}")
     print("=" * 60)
     
     # Start the server
@@ -46,8 +59,11 @@ def main():
         host=host,
         port=port,
         reload=reload,
+        workers=workers,
+        loop=loop,
+        http=http,
         log_level=log_level,
-        access_log=True
+        access_log=access_log
     )
 
 if __name__ == "__main__":